@@ -8,212 +8,351 @@ Run: python financial_ai_agent.py
 """
 
 # ───────────────────────── imports & config ─────────────────────────
-import os, sqlite3, pdfplumber, re
+import hashlib, os, sqlite3, re
+from enum import IntEnum
 import gradio as gr
 from dotenv import load_dotenv
-from openai import OpenAI
+
+try:
+    from rapidfuzz import fuzz, process  # C++ fuzzy matcher, typo-tolerant
+except ImportError:
+    process = None  # fall back to the regex helpers below
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+_client = None
+
+def _get_client():
+    """Build the OpenAI client on first use — keeps import off the cold path."""
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+        import httpx  # already an openai dependency
+        # reuse keep-alive connections across turns via the http_client hook
+        _client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_keepalive_connections=10,
+                                    keepalive_expiry=30)),
+        )
+    return _client
 
 DB = "customers.db"
 MAX_CHARS = 8_000  # max context sent to GPT
-state = {"step": "start"}  # conversation FSM
-pdf_text: str | None = None  # extracted text of uploaded file
+
+# ─────────────────────── conversation FSM ───────────────────────
+class Step(IntEnum):
+    START = 0
+    TYPE = 1
+    NEW_NAME = 2
+    NEW_PHONE = 3
+    NEW_EMAIL = 4
+    PHONE = 5
+    ZIP = 6
+    OK_EXIST = 7
+    OK_NEW = 8
+    CONFIRM_EXIT = 9
+
+# collapse runs of horizontal whitespace so the 8k budget holds more content
+_WS_RE = re.compile(r"[ \t\r\f\v]+")
+
+# per-session conversation state lives in a gr.State dict (see UI build);
+# only the extraction cache is shared, and it is keyed by file identity
+_pdf_cache: dict[tuple[str, float], str] = {}  # (path, mtime) → extracted text
 
 # ────────────────────────── helpers ──────────────────────────
 
+# one persistent connection — reopening per query costs more than the reads
+_CONN = sqlite3.connect(DB, check_same_thread=False)
+_CONN.row_factory = sqlite3.Row
+_CONN.execute("PRAGMA journal_mode=WAL")
+_CONN.execute("PRAGMA synchronous=NORMAL")
+# composite index → recent-transactions query becomes an index range scan, no sort
+_CONN.execute("CREATE INDEX IF NOT EXISTS ix_tx_cust_date ON transactions(customer_id, date DESC)")
+_CONN.execute("ANALYZE")
+
 def db():
-    conn = sqlite3.connect(DB)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Shared connection; *with db() as c:* now scopes a transaction, not a close."""
+    return _CONN
 
 def extract(path: str) -> str:
+    key = (path, os.path.getmtime(path))
+    if key in _pdf_cache:
+        return _pdf_cache[key]
+    # heavy imports deferred until a PDF is actually uploaded
+    try:
+        import pymupdf  # MuPDF C core — far faster than pdfplumber for raw text
+    except ImportError:
+        pymupdf = None  # fall back to pdfplumber below
     parts: list[str] = []
-    with pdfplumber.open(path) as pdf:
-        for pg in pdf.pages:
-            txt = pg.extract_text()
+    if pymupdf is not None:
+        doc = pymupdf.open(path)
+        total = 0
+        for page in doc:
+            txt = page.get_text("text")
             if txt:
                 parts.append(txt)
-    return "\n".join(parts)[:MAX_CHARS]
-
-def ask_llm(question: str, context: str) -> str:
-    rsp = client.chat.completions.create(
+                total += len(txt)
+                if total >= MAX_CHARS:  # no point parsing trailing pages
+                    break
+        doc.close()
+    else:
+        import pdfplumber
+        # sequential on purpose: all pages share one pdfminer parser/stream,
+        # which is not thread-safe — the early exit is the real win anyway
+        with pdfplumber.open(path) as pdf:
+            total = 0
+            for page in pdf.pages:
+                txt = page.extract_text()
+                if txt:
+                    parts.append(txt)
+                    total += len(txt) + 1  # +1 for the join separator
+                if total >= MAX_CHARS:  # no point parsing trailing pages
+                    break
+    text = _WS_RE.sub(" ", "\n".join(parts))[:MAX_CHARS]
+    _pdf_cache[key] = text
+    return text
+
+_llm_cache: dict[tuple[str, str], str] = {}  # (question, ctx_hash) → full answer
+_LLM_CACHE_MAX = 512
+
+async def ask_llm(question: str, context: str):
+    """Yield the growing answer as tokens stream in; repeats hit the local cache."""
+    q = " ".join(question.lower().split())
+    ctx_hash = hashlib.blake2b(context.encode(), digest_size=16).hexdigest()
+    key = (q, ctx_hash)
+    if key in _llm_cache:
+        yield _llm_cache[key]
+        return
+    acc = ""
+    stream = await _get_client().chat.completions.create(
         model="gpt-3.5-turbo",
         temperature=0.4,
         max_tokens=500,
+        stream=True,
         messages=[
             {"role": "system", "content": "You are a helpful financial assistant."},
             {"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{question}"},
         ],
     )
-    return rsp.choices[0].message.content.strip()
-
-def again() -> str:
-    return ("Anything else I can help with? (balance • transactions • savings "
-            "— or type **upload** to attach a PDF | **exit** to leave)")
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content
+        if delta:
+            acc += delta
+            yield acc
+    if len(_llm_cache) >= _LLM_CACHE_MAX:
+        _llm_cache.pop(next(iter(_llm_cache)))
+    _llm_cache[key] = acc.strip()
+
+AGAIN = ("Anything else I can help with? (balance • transactions • savings "
+         "— or type **upload** to attach a PDF | **exit** to leave)")
 
 # tiny fuzzy‑match helpers -------------------------------------------------
 re_existing = re.compile(r"\b(exist|current|old|return)\w*", re.I)
 re_new = re.compile(r"\b(new|sign|open|join)\w*", re.I)
 
+EXIST_TOKENS = ("existing", "current", "old", "returning", "customer")
+NEW_TOKENS = ("new", "signup", "open", "join", "register")
+
+# single precompiled scan instead of repeated `"kw" in low` substring tests
+INTENT_RE = re.compile(r"\b(balance|transactions?|recent|savings?)\b", re.I)
+
+# O(1) hashed membership instead of linear tuple scans
+EXIT_WORDS = frozenset({"exit", "quit", "leave"})
+THANKS = frozenset({"bye", "thanks", "thank you"})
+
 def looks_like_existing(text: str) -> bool:
+    if process is not None:  # also catches typos like "exsting"
+        return process.extractOne(text, EXIST_TOKENS, scorer=fuzz.partial_ratio,
+                                  score_cutoff=80) is not None
     return bool(re_existing.search(text))
 
 def looks_like_new(text: str) -> bool:
+    if process is not None:
+        return process.extractOne(text, NEW_TOKENS, scorer=fuzz.partial_ratio,
+                                  score_cutoff=80) is not None
     return bool(re_new.search(text))
 
+# ─────────────────── step handlers (table-driven) ───────────────────
+# Each handler: (msg, low, state) → (next_step, reply); reply is either an
+# assistant-message dict or a generator of them (streamed LLM answers).
+
+def _reset(_state):
+    _state.clear()
+    _state["step"] = Step.START
+
+def _say(text: str) -> dict:
+    return {"role": "assistant", "content": text}
+
+def _handle_start(msg, low, _state):
+    return Step.TYPE, _say("👋 **Welcome to JP Morgan Chase Digital Banking Assistant!**\n"
+                           "Are you an **existing customer** or a **new user** wishing to open an account?")
+
+def _handle_type(msg, low, _state):
+    if looks_like_existing(low):
+        return Step.PHONE, _say("Great – please enter your registered **phone number**:")
+    if looks_like_new(low):
+        return Step.NEW_NAME, _say("Let's get to know you. What's your **first and last name**?")
+    return Step.TYPE, _say("Please type **existing** or **new** to continue.")
+
+def _handle_new_name(msg, low, _state):
+    # capitalize() per word — .title() does full Unicode-category scans
+    _state["prospect_name"] = " ".join(w.capitalize() for w in msg.split())
+    return Step.NEW_PHONE, _say("Thanks. May I have a **phone number** to reach you?")
+
+def _handle_new_phone(msg, low, _state):
+    _state["prospect_phone"] = msg
+    return Step.NEW_EMAIL, _say("And finally, your **e‑mail address**?")
+
+def _handle_new_email(msg, low, _state):
+    name = _state.pop("prospect_name")
+    # potential DB insert for lead capture could go here
+    _state.clear()
+    return Step.OK_NEW, _say(f"Thanks {name}! A banker will contact you soon.\n\n" + AGAIN)
+
+def _handle_phone(msg, low, _state):
+    # one combined lookup — zip and balance ride along for later steps
+    with db() as c:
+        row = c.execute("SELECT id, first_name, last_name, zip_code, balance FROM customers WHERE phone=?", (msg,)).fetchone()
+    if not row:
+        return Step.PHONE, _say("Number not found — please try again:")
+    _state.update(cid=row["id"], fn=row["first_name"], ln=row["last_name"],
+                  zip_code=row["zip_code"], balance=row["balance"])
+    return Step.ZIP, _say("Thank you. Now enter your **ZIP code**:")
+
+def _handle_zip(msg, low, _state):
+    if msg != _state["zip_code"]:
+        return Step.ZIP, _say("❌ ZIP doesn't match our records — try again:")
+    return Step.OK_EXIST, _say(f"✅ Welcome back {_state['fn']}!\n\n" + AGAIN)
+
+def _handle_ok(msg, low, _state):
+    step = _state["step"]
+    _tail = AGAIN
+    m = INTENT_RE.search(low)
+    intent = m.group(1) if m else None  # low is already case-folded
+
+    if low in EXIT_WORDS:
+        return Step.CONFIRM_EXIT, _say("Are you sure you want to end the chat? (yes / no)")
+    if low in THANKS:
+        _state.clear()
+        return Step.START, _say("It was a pleasure assisting you – goodbye!")
+
+    if low == "upload":
+        return step, _say("Click **Upload** below, then ask me about the document.")
+
+    if step == Step.OK_EXIST:
+        if intent == "balance":
+            bal = _state["balance"]  # fetched during phone lookup
+            return step, _say(f"Your balance is **${bal:,.2f}**.\n\n" + _tail)
+
+        if intent in ("transaction", "transactions", "recent"):
+            with db() as c:
+                rows = c.execute(
+                    """SELECT date, description, amount FROM transactions
+                    WHERE customer_id=? ORDER BY date DESC LIMIT 5""",
+                    (_state["cid"],)).fetchall()
+            if not rows:
+                return step, _say("No recent transactions.\n\n" + _tail)
+            out = ["Here are your last 5 transactions:"]
+            out += [f"- {r['date']}: {r['description']} (${r['amount']:.2f})" for r in rows]
+            return step, _say("\n".join(out) + "\n\n" + _tail)
+
+    if intent in ("saving", "savings"):
+        return step, _say("We offer Basic Savings, **High‑Yield Savings** (4.5% APY) "
+                          "and Money‑Market Accounts. Reply **yes** for the link.\n\n" + _tail)
+
+    if low == "yes":
+        return step, _say("Apply here → https://www.chase.com/personal/savings\n\n" + _tail)
+
+    if _state.get("pdf_text"):
+        return step, _stream_reply(msg, _state["pdf_text"], "\n\n" + _tail)
+
+    return step, _say(_tail)
+
+def _handle_confirm_exit(msg, low, _state):
+    if low.startswith("y"):
+        _state.clear()
+        return Step.START, _say("Session closed. Have a great day!")
+    next_step = Step.OK_EXIST if "cid" in _state else Step.OK_NEW
+    return next_step, _say("No worries – we're still connected. " + AGAIN)
+
+HANDLERS = {
+    Step.START: _handle_start,
+    Step.TYPE: _handle_type,
+    Step.NEW_NAME: _handle_new_name,
+    Step.NEW_PHONE: _handle_new_phone,
+    Step.NEW_EMAIL: _handle_new_email,
+    Step.PHONE: _handle_phone,
+    Step.ZIP: _handle_zip,
+    Step.OK_EXIST: _handle_ok,
+    Step.OK_NEW: _handle_ok,
+    Step.CONFIRM_EXIT: _handle_confirm_exit,
+}
+
 # ────────────────────────── chat handler ──────────────────────────
 
-def chat(user, hist):
-    global pdf_text
+async def _stream_reply(question: str, context: str, suffix: str):
+    """Wrap the streamed LLM answer into growing assistant messages."""
+    async for partial in ask_llm(question, context):
+        yield {"role": "assistant", "content": partial + suffix}
+
+async def chat(user, hist, sess):
+    """Async generator façade for Gradio: the event loop serves other users
+    during the LLM wait; non-LLM turns yield a single message."""
+    reply = _chat_turn(user, hist, sess)
+    if isinstance(reply, dict):
+        yield reply
+        return
+    try:
+        async for item in reply:
+            yield item
+    except Exception as err:  # stream failures happen outside the FSM's try
+        print("❗", err)
+        _reset(sess)
+        yield _say("Internal error – please begin again.")
+
+def _chat_turn(user, hist, sess):
+    _state = sess  # per-session dict from gr.State
     msg = user.strip()
     low = msg.lower()
-    step = state.get("step", "start")
+    step = _state.get("step", Step.START)
 
     try:
-        # ────────── start ──────────
-        if step == "start":
-            state["step"] = "type"
-            return {"role": "assistant",
-                    "content": ("👋 **Welcome to JP Morgan Chase Digital Banking Assistant!**\n"
-                                "Are you an **existing customer** or a **new user** wishing to open an account?")}
-
-        # ────────── choose customer type ──────────
-        if step == "type":
-            if looks_like_existing(low):
-                state["step"] = "phone"
-                return {"role": "assistant", "content": "Great – please enter your registered **phone number**:"}
-            if looks_like_new(low):
-                state["step"] = "new_name"
-                return {"role": "assistant", "content": "Let's get to know you. What's your **first and last name**?"}
-            return {"role": "assistant", "content": "Please type **existing** or **new** to continue."}
-
-        # ────────── new‑user capture ──────────
-        if step == "new_name":
-            state["prospect_name"] = msg.title()
-            state["step"] = "new_phone"
-            return {"role": "assistant", "content": "Thanks. May I have a **phone number** to reach you?"}
-
-        if step == "new_phone":
-            state["prospect_phone"] = msg
-            state["step"] = "new_email"
-            return {"role": "assistant", "content": "And finally, your **e‑mail address**?"}
-
-        if step == "new_email":
-            name = state.pop("prospect_name")
-            # potential DB insert for lead capture could go here
-            state.clear()
-            state["step"] = "ok_new"
-            return {"role": "assistant",
-                    "content": (f"Thanks {name}! A banker will contact you soon.\n\n" + again())}
-
-        # ────────── phone verification ──────────
-        if step == "phone":
-            with db() as c:
-                row = c.execute("SELECT id, first_name, last_name FROM customers WHERE phone=?", (msg,)).fetchone()
-            if not row:
-                return {"role": "assistant", "content": "Number not found — please try again:"}
-            state.update(cid=row["id"], fn=row["first_name"], ln=row["last_name"], step="zip")
-            return {"role": "assistant", "content": "Thank you. Now enter your **ZIP code**:"}
-
-        # ────────── ZIP verification ──────────
-        if step == "zip":
-            with db() as c:
-                real_zip = c.execute("SELECT zip_code FROM customers WHERE id=?", (state["cid"],)).fetchone()["zip_code"]
-            if msg != real_zip:
-                return {"role": "assistant", "content": "❌ ZIP doesn't match our records — try again:"}
-            state["step"] = "ok_exist"
-            return {"role": "assistant", "content": f"✅ Welcome back {state['fn']}!\n\n" + again()}
-
-        # ────────── main assistant actions ──────────
-        if step in ("ok_exist", "ok_new"):
-            if low in ("exit", "quit", "leave"):
-                state["step"] = "confirm_exit"
-                return {"role": "assistant", "content": "Are you sure you want to end the chat? (yes / no)"}
-            if low in ("bye", "thanks", "thank you"):
-                state.clear()
-                state["step"] = "start"
-                pdf_text = None
-                return {"role": "assistant", "content": "It was a pleasure assisting you – goodbye!"}
-
-            if low == "upload":
-                return {"role": "assistant", "content": "Click **Upload** below, then ask me about the document."}
-
-            if step == "ok_exist":
-                if "balance" in low:
-                    with db() as c:
-                        bal = c.execute("SELECT balance FROM customers WHERE id=?", (state["cid"],)).fetchone()["balance"]
-                    return {"role": "assistant", "content": f"Your balance is **${bal:,.2f}**.\n\n" + again()}
-
-                if "transaction" in low or "recent" in low:
-                    with db() as c:
-                        rows = c.execute(
-                            """SELECT date, description, amount FROM transactions
-                            WHERE customer_id=? ORDER BY date DESC LIMIT 5""",
-                            (state["cid"],)).fetchall()
-                    if not rows:
-                        return {"role": "assistant", "content": "No recent transactions.\n\n" + again()}
-                    out = ["Here are your last 5 transactions:"]
-                    out += [f"- {r['date']}: {r['description']} (${r['amount']:.2f})" for r in rows]
-                    return {"role": "assistant", "content": "\n".join(out) + "\n\n" + again()}
-
-            if "saving" in low:
-                return {"role": "assistant",
-                        "content": ("We offer Basic Savings, **High‑Yield Savings** (4.5% APY) "
-                                    "and Money‑Market Accounts. Reply **yes** for the link.\n\n" + again())}
-
-            if low == "yes":
-                return {"role": "assistant",
-                        "content": "Apply here → https://www.chase.com/personal/savings\n\n" + again()}
-
-            if pdf_text:
-                return {"role": "assistant", "content": ask_llm(msg, pdf_text) + "\n\n" + again()}
-
-            return {"role": "assistant", "content": again()}
-
-        if step == "confirm_exit":
-            if low.startswith("y"):
-                state.clear()
-                state["step"] = "start"
-                pdf_text = None
-                return {"role": "assistant", "content": "Session closed. Have a great day!"}
-            state["step"] = "ok_exist" if "cid" in state else "ok_new"
-            return {"role": "assistant", "content": "No worries – we're still connected. " + again()}
-
-        state.clear()
-        state["step"] = "start"
-        pdf_text = None
-        return {"role": "assistant", "content": "Something went wrong – let's start from the top."}
+        handler = HANDLERS.get(step)
+        if handler is None:  # unknown state safety net
+            _reset(_state)
+            return _say("Something went wrong – let's start from the top.")
+        next_step, reply = handler(msg, low, _state)
+        _state["step"] = next_step
+        return reply
 
     except Exception as err:
         print("❗", err)
-        state.clear()
-        state["step"] = "start"
-        pdf_text = None
-        return {"role": "assistant", "content": "Internal error – please begin again."}
+        _reset(_state)
+        return _say("Internal error – please begin again.")
 
 # ───────────────────────── upload handler ─────────────────────────
 
-def upload(path: str):
-    global pdf_text
+def upload(path: str, sess: dict):
     if not path:
-        pdf_text = None
+        sess["pdf_text"] = None
         return ""
-    pdf_text = extract(path)
+    sess["pdf_text"] = extract(path)
     return f"✅ {os.path.basename(path)} uploaded successfully! Ask away."
 
 # ───────────────────────── UI build ─────────────────────────
 with gr.Blocks(theme=gr.themes.Soft()) as demo:
     gr.Markdown("# JP Morgan Chase • Financial Assistant")
+    session = gr.State(lambda: {"step": Step.START, "pdf_text": None})
     chat_ui = gr.ChatInterface(
         fn=chat,
         chatbot=gr.Chatbot(type="messages"),
-        textbox=gr.Textbox(placeholder="Say hello, or type upload / exit …")
+        textbox=gr.Textbox(placeholder="Say hello, or type upload / exit …"),
+        additional_inputs=[session],
     )
     status = gr.Textbox(label="Upload status", interactive=False)
     uploader = gr.File(label="Upload Financial Document (PDF)", file_types=[".pdf"], type="filepath")
-    uploader.change(upload, inputs=uploader, outputs=status)
+    uploader.change(upload, inputs=[uploader, session], outputs=status)
 
 if __name__ == "__main__":
-    demo.launch(share=True)
\ No newline at end of file
+    demo.launch(share=True)
@@ -1,7 +1,9 @@
 import pdfplumber
 from openai import OpenAI
 import gradio as gr
+import atexit
 import sqlite3
+import threading
 import os
 from dotenv import load_dotenv
 
@@ -15,15 +17,46 @@ client = OpenAI(api_key=api_key)
 customer_info = {}
 uploaded_file = None
 
-# Save customer info into database
+# Persistent connection + queued lead inserts (one fsync per batch, not per signup)
+_CONN = sqlite3.connect('customers.db', check_same_thread=False)
+_CONN.execute("PRAGMA journal_mode=WAL")
+_CONN.execute("PRAGMA synchronous=NORMAL")
+
+_lead_queue: list[tuple[str, str, str]] = []
+_lead_lock = threading.Lock()
+_FLUSH_SECS = 2.0
+
+def _drain_leads():
+    with _lead_lock:
+        batch = list(_lead_queue)
+        _lead_queue.clear()
+    if batch:
+        with _CONN:
+            _CONN.executemany(
+                "INSERT INTO customers (name, phone, email) VALUES (?, ?, ?)", batch)
+
+def _flush_leads():
+    try:
+        _drain_leads()
+    except Exception as err:
+        # report and keep going — an exception here would kill the timer
+        # thread and silently drop every signup queued afterwards
+        print("❗ Lead flush failed:", err)
+    finally:
+        _schedule_flush()
+
+def _schedule_flush():
+    timer = threading.Timer(_FLUSH_SECS, _flush_leads)
+    timer.daemon = True
+    timer.start()
+
+_schedule_flush()
+atexit.register(_drain_leads)   # don't lose signups queued in the last window
+
+# Save customer info into database (queued, flushed every _FLUSH_SECS)
 def save_customer_info(name, phone, email):
-    conn = sqlite3.connect('customers.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO customers (name, phone, email) VALUES (?, ?, ?)
-    ''', (name, phone, email))
-    conn.commit()
-    conn.close()
+    with _lead_lock:
+        _lead_queue.append((name, phone, email))
 
 # Extract text from PDF
 def extract_text_from_pdf(file_path):
@@ -1,202 +1,306 @@
 # financial_ai_agent.py  –  27 Apr 2025
-import os, sqlite3, pdfplumber
+import hashlib, os, re, sqlite3
 from datetime import datetime
+from enum import IntEnum
 import gradio as gr
 from dotenv import load_dotenv
-from openai import OpenAI
 
 # ─────────────────────────  config  ──────────────────────────
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+_client = None
+
+def _get_client():
+    """Build the OpenAI client on first use — keeps import off the cold path."""
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+        import httpx  # already an openai dependency
+        # reuse keep-alive connections across turns via the http_client hook
+        _client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_keepalive_connections=10,
+                                    keepalive_expiry=30)),
+        )
+    return _client
 
 # ─────────────────────────  globals  ─────────────────────────
-user_state = {"step": "start"}        # conversation FSM
-uploaded_file_path: str | None = None
+class Step(IntEnum):
+    START = 0
+    AWAIT_TYPE = 1
+    NEW_NAME = 2
+    NEW_EMAIL = 3
+    AWAIT_PHONE = 4
+    AWAIT_ZIP = 5
+    VERIFIED = 6
+
+# per-session conversation state lives in a gr.State dict (see UI build);
+# only the extraction cache is shared, and it is keyed by file identity
+_pdf_cache: dict[tuple[str, float], str] = {}   # (path, mtime) → extracted text
+
+# precompiled keyword scans — one regex pass instead of chained `in` tests
+INTENT_RE = re.compile(r"\b(balance|transactions?|recent|savings?)\b")
+PDF_QA_RE = re.compile(r"what|how much|profit|revenue|summary|explain|detail")
+EXIT_RE = re.compile(r"bye|thank|exit|close")
+
+# collapse runs of horizontal whitespace so the 8k budget holds more content
+_WS_RE = re.compile(r"[ \t\r\f\v]+")
+
+# O(1) hashed membership instead of a linear tuple scan
+YES = frozenset({"yes", "yes please", "yes, please", "yep"})
 
 # ────────────────────────  utilities  ────────────────────────
+# one persistent connection — reopening per query costs more than the reads
+_CONN = sqlite3.connect("customers.db", check_same_thread=False)
+_CONN.row_factory = sqlite3.Row
+_CONN.execute("PRAGMA journal_mode=WAL")
+_CONN.execute("PRAGMA synchronous=NORMAL")
+# composite index → recent-transactions query becomes an index range scan, no sort
+_CONN.execute("CREATE INDEX IF NOT EXISTS ix_tx_cust_date ON transactions(customer_id, date DESC)")
+_CONN.execute("ANALYZE")
+
 def db():
-    conn = sqlite3.connect("customers.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Shared connection; *with db() as conn:* scopes a transaction, not a close."""
+    return _CONN
 
 def extract_pdf(path: str) -> str:
+    key = (path, os.path.getmtime(path))
+    if key in _pdf_cache:
+        return _pdf_cache[key]
+    # heavy imports deferred until a PDF is actually uploaded
+    try:
+        import pymupdf  # MuPDF C core — far faster than pdfplumber for raw text
+    except ImportError:
+        pymupdf = None  # fall back to pdfplumber below
     txt = []
-    with pdfplumber.open(path) as pdf:
-        for pg in pdf.pages:
-            if (t := pg.extract_text()):
+    if pymupdf is not None:
+        doc = pymupdf.open(path)
+        total = 0
+        for page in doc:
+            if (t := page.get_text("text")):
                 txt.append(t)
+                total += len(t)
+                if total >= 8_000:      # no point parsing trailing pages
+                    break
+        doc.close()
+    else:
+        import pdfplumber
+        # sequential on purpose: all pages share one pdfminer parser/stream,
+        # which is not thread-safe — the early exit is the real win anyway
+        with pdfplumber.open(path) as pdf:
+            total = 0
+            for page in pdf.pages:
+                if (t := page.extract_text()):
+                    txt.append(t)
+                    total += len(t) + 1  # +1 for the join separator
+                if total >= 8_000:      # no point parsing trailing pages
+                    break
     # keep token-cost reasonable
-    return "\n".join(txt)[:8_000]
+    text = _WS_RE.sub(" ", "\n".join(txt))[:8_000]
+    _pdf_cache[key] = text
+    return text
 
-def ask_llm(q: str, ctx: str) -> str:
-    rsp = client.chat.completions.create(
+_llm_cache: dict[tuple[str, str], str] = {}   # (question, ctx_hash) → full answer
+_LLM_CACHE_MAX = 512
+
+async def ask_llm(q: str, ctx: str):
+    """Yield the growing answer as tokens stream in; repeats hit the local cache."""
+    q_norm = " ".join(q.lower().split())
+    ctx_hash = hashlib.blake2b(ctx.encode(), digest_size=16).hexdigest()
+    key = (q_norm, ctx_hash)
+    if key in _llm_cache:
+        yield _llm_cache[key]
+        return
+    acc = ""
+    stream = await _get_client().chat.completions.create(
         model="gpt-3.5-turbo",
         temperature=0.4,
         max_tokens=512,
+        stream=True,
         messages=[
             {"role": "system", "content": "You are a helpful financial assistant."},
             {"role": "user",    "content": f"Context:\n{ctx}\n\nQuestion:\n{q}"}
         ]
     )
-    return rsp.choices[0].message.content.strip()
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content
+        if delta:
+            acc += delta
+            yield acc
+    if len(_llm_cache) >= _LLM_CACHE_MAX:
+        _llm_cache.pop(next(iter(_llm_cache)))
+    _llm_cache[key] = acc.strip()
+
+# ─────────────── step handlers (table-driven) ────────────────
+# Each handler: (msg, lower, state) → (next_step, reply); reply is either an
+# assistant-message dict or a generator of them (streamed LLM answers).
+
+def _say(text: str) -> dict:
+    return {"role": "assistant", "content": text}
+
+def _handle_start(msg, lower, _state):
+    return Step.AWAIT_TYPE, _say("Welcome to JP Morgan Chase Financial Assistant.\n"
+                                 "Are you an **existing customer** or a **new user**?")
+
+def _handle_await_type(msg, lower, _state):
+    if "existing" in lower:
+        return Step.AWAIT_PHONE, _say("Great!  Please enter your registered phone number:")
+    if "new" in lower:
+        return Step.NEW_NAME, _say("Welcome aboard!  What is your full name?")
+    return Step.AWAIT_TYPE, _say("Please type **existing** or **new** to continue.")
+
+def _handle_new_name(msg, lower, _state):
+    _state["new_name"] = msg
+    return Step.NEW_EMAIL, _say("Thanks.  And your e-mail address?")
+
+def _handle_new_email(msg, lower, _state):
+    # (in a real app you'd insert into a prospects table here)
+    name = _state.get("new_name", "")
+    _state.clear()
+    return Step.START, _say(f"Thanks {name}!  A banker will reach out soon to "
+                            "finish onboarding.  Have a great day!")
+
+def _handle_await_phone(msg, lower, _state):
+    # one combined lookup — zip and balance ride along for later steps
+    with db() as conn:
+        cur = conn.execute(
+            "SELECT id, first_name, last_name, zip_code, balance "
+            "FROM customers WHERE phone=?",
+            (msg,))
+        row = cur.fetchone()
+    if row:
+        _state.update(
+            customer_id=row["id"],
+            first=row["first_name"],
+            last=row["last_name"],
+            zip_code=row["zip_code"],
+            balance=row["balance"],
+        )
+        return Step.AWAIT_ZIP, _say("Thanks.  Now, please enter your ZIP code:")
+    return Step.AWAIT_PHONE, _say("Phone number not found.  Please try again:")
+
+def _handle_await_zip(msg, lower, _state):
+    if msg == _state["zip_code"]:
+        return Step.VERIFIED, _say(f"✅ Verified.  Welcome back {_state['first']} "
+                                   f"{_state['last']}!\n"
+                                   "Ask me about your **balance**, **recent transactions**, "
+                                   "or **savings products**.")
+    return Step.AWAIT_ZIP, _say("❌ ZIP code incorrect.  Please try again:")
+
+def _handle_verified(msg, lower, _state):
+    cid = _state["customer_id"]
+    m = INTENT_RE.search(lower)
+    intent = m.group(1) if m else None
+
+    # balance
+    if intent == "balance":
+        bal = _state["balance"]     # fetched during phone lookup
+        return Step.VERIFIED, _say(f"Your current balance is **${bal:,.2f}**.")
+
+    # recent transactions
+    if intent in ("transaction", "transactions", "recent"):
+        with db() as conn:
+            rows = conn.execute(
+                """SELECT date, description, amount
+                FROM transactions
+                WHERE customer_id=?
+                ORDER BY date DESC LIMIT 5""", (cid,)).fetchall()
+        if not rows:
+            return Step.VERIFIED, _say("No recent transactions found.")
+        lines = ["Here are your last 5 transactions:"]
+        for r in rows:
+            lines.append(f"- {r['date']}: {r['description']} "
+                        f"(${r['amount']:.2f})")
+        return Step.VERIFIED, _say("\n".join(lines))
+
+    # savings products
+    if intent in ("saving", "savings"):
+        return Step.VERIFIED, _say(
+            "We offer Basic Savings, **High-Yield Savings** (up to 4.5 % APY), "
+            "and Money-Market Accounts.\n"
+            "Would you like the **application link**?")
+
+    # user says "yes" after savings offer
+    if lower in YES:
+        return Step.VERIFIED, _say(
+            "You can start an application here: "
+            "<https://www.chase.com/personal/savings>")
+
+    # PDF Q&A
+    path = _state.get("uploaded_file_path")
+    if path and path.lower().endswith(".pdf"):
+        if PDF_QA_RE.search(lower):
+            ctx = extract_pdf(path)
+            return Step.VERIFIED, _stream_reply(msg, ctx)
+
+    # polite exit
+    if EXIT_RE.search(lower):
+        _state.clear()
+        return Step.START, _say("Thank you for banking with JP Morgan Chase.  Goodbye!")
+
+    # fallback
+    return Step.VERIFIED, _say(
+        "I'm here to help with **balance**, **transactions**, or "
+        "**savings products**.  What would you like to know?")
+
+HANDLERS = {
+    Step.START: _handle_start,
+    Step.AWAIT_TYPE: _handle_await_type,
+    Step.NEW_NAME: _handle_new_name,
+    Step.NEW_EMAIL: _handle_new_email,
+    Step.AWAIT_PHONE: _handle_await_phone,
+    Step.AWAIT_ZIP: _handle_await_zip,
+    Step.VERIFIED: _handle_verified,
+}
 
 # ───────────────────────  chat handler  ──────────────────────
-def bot(user_msg: str, history):
+async def _stream_reply(question: str, ctx: str):
+    """Wrap the streamed LLM answer into growing assistant messages."""
+    async for partial in ask_llm(question, ctx):
+        yield {"role": "assistant", "content": partial}
+
+async def bot(user_msg: str, history, sess):
+    """Async generator façade for Gradio: the event loop serves other users
+    during the LLM wait; non-LLM turns yield a single message."""
+    reply = _bot_turn(user_msg, history, sess)
+    if isinstance(reply, dict):
+        yield reply
+        return
+    try:
+        async for item in reply:
+            yield item
+    except Exception as err:  # stream failures happen outside the FSM's try
+        print("❗", err)
+        sess.clear(); sess["step"] = Step.START
+        yield _say("Sorry, an internal error occurred.  Please start again.")
+
+def _bot_turn(user_msg: str, history, sess):
     """Gradio ChatInterface fn(message:str, history:list[dict]) -> dict"""
+    _state = sess             # per-session dict from gr.State
     msg = user_msg.strip()
     lower = msg.lower()
-    step = user_state["step"]
+    step = _state["step"]
 
     try:
-        # ──────────  step: start  ──────────
-        if step == "start":
-            user_state["step"] = "await_type"
-            return {"role": "assistant",
-                    "content": ("Welcome to JP Morgan Chase Financial Assistant.\n"
-                                "Are you an **existing customer** or a **new user**?")}
-
-        # ──────────  step: existing / new  ──────────
-        if step == "await_type":
-            if "existing" in lower:
-                user_state["step"] = "await_phone"
-                return {"role": "assistant",
-                        "content": "Great!  Please enter your registered phone number:"}
-            if "new" in lower:
-                user_state["step"] = "new_name"
-                return {"role": "assistant",
-                        "content": "Welcome aboard!  What is your full name?"}
-            return {"role": "assistant",
-                    "content": "Please type **existing** or **new** to continue."}
-
-        # ──────────  new-user mini-flow  ──────────
-        if step == "new_name":
-            user_state["new_name"] = msg
-            user_state["step"] = "new_email"
-            return {"role": "assistant",
-                    "content": "Thanks.  And your e-mail address?"}
-
-        if step == "new_email":
-            # (in a real app you'd insert into a prospects table here)
-            name = user_state.get("new_name", "")
-            user_state.clear(); user_state["step"] = "start"
-            return {"role": "assistant",
-                    "content": (f"Thanks {name}!  A banker will reach out soon to "
-                                "finish onboarding.  Have a great day!")}
-
-        # ──────────  existing-customer auth  ──────────
-        if step == "await_phone":
-            with db() as conn:
-                cur = conn.execute(
-                    "SELECT id, first_name, last_name FROM customers WHERE phone=?",
-                    (msg,))
-                row = cur.fetchone()
-            if row:
-                user_state.update(
-                    customer_id=row["id"],
-                    first=row["first_name"],
-                    last=row["last_name"],
-                    step="await_zip",
-                )
-                return {"role": "assistant",
-                        "content": "Thanks.  Now, please enter your ZIP code:"}
-            return {"role": "assistant",
-                    "content": "Phone number not found.  Please try again:"}
-
-        if step == "await_zip":
-            with db() as conn:
-                cur = conn.execute("SELECT zip_code FROM customers WHERE id=?",
-                                (user_state["customer_id"],))
-                zip_code = cur.fetchone()["zip_code"]
-            if msg == zip_code:
-                user_state["step"] = "verified"
-                return {"role": "assistant",
-                        "content":
-                        (f"✅ Verified.  Welcome back {user_state['first']} "
-                        f"{user_state['last']}!\n"
-                         "Ask me about your **balance**, **recent transactions**, "
-                         "or **savings products**.")}
-            return {"role": "assistant",
-                    "content": "❌ ZIP code incorrect.  Please try again:"}
-
-        # ──────────  verified customer actions  ──────────
-        if step == "verified":
-            cid = user_state["customer_id"]
-
-            # balance
-            if "balance" in lower:
-                with db() as conn:
-                    bal = conn.execute("SELECT balance FROM customers WHERE id=?",
-                                    (cid,)).fetchone()["balance"]
-                return {"role": "assistant",
-                        "content": f"Your current balance is **${bal:,.2f}**."}
-
-            # recent transactions
-            if "transaction" in lower or "recent" in lower:
-                with db() as conn:
-                    rows = conn.execute(
-                        """SELECT date, description, amount
-                        FROM transactions
-                        WHERE customer_id=?
-                        ORDER BY date DESC LIMIT 5""", (cid,)).fetchall()
-                if not rows:
-                    return {"role": "assistant",
-                            "content": "No recent transactions found."}
-                lines = ["Here are your last 5 transactions:"]
-                for r in rows:
-                    lines.append(f"- {r['date']}: {r['description']} "
-                                f"(${r['amount']:.2f})")
-                return {"role": "assistant", "content": "\n".join(lines)}
-
-            # savings products
-            if "saving" in lower:
-                return {"role": "assistant",
-                        "content":
-                        ("We offer Basic Savings, **High-Yield Savings** (up to 4.5 % APY), "
-                        "and Money-Market Accounts.\n"
-                         "Would you like the **application link**?")}
-
-            # user says "yes" after savings offer
-            if lower in ("yes", "yes please", "yes, please", "yep"):
-                return {"role": "assistant",
-                        "content":
-                        "You can start an application here: "
-                        "<https://www.chase.com/personal/savings>"}
-
-            # PDF Q&A
-            if uploaded_file_path and uploaded_file_path.lower().endswith(".pdf"):
-                if any(k in lower for k in ("what", "how much", "profit", "revenue",
-                                            "summary", "explain", "detail")):
-                    ctx = extract_pdf(uploaded_file_path)
-                    answer = ask_llm(msg, ctx)
-                    return {"role": "assistant", "content": answer}
-
-            # polite exit
-            if any(x in lower for x in ("bye", "thank", "thanks", "exit", "close")):
-                user_state.clear(); user_state["step"] = "start"
-                return {"role": "assistant",
-                        "content": "Thank you for banking with JP Morgan Chase.  Goodbye!"}
-
-            # fallback
-            return {"role": "assistant",
-                    "content":
-                    "I'm here to help with **balance**, **transactions**, or "
-                    "**savings products**.  What would you like to know?"}
-
-        # ──────────  unknown state fallback  ──────────
-        user_state.clear(); user_state["step"] = "start"
-        return {"role": "assistant",
-                "content": "Something went wrong.  Let's start over."}
+        handler = HANDLERS.get(step)
+        if handler is None:   # unknown state safety net
+            _state.clear(); _state["step"] = Step.START
+            return _say("Something went wrong.  Let's start over.")
+        next_step, reply = handler(msg, lower, _state)
+        _state["step"] = next_step
+        return reply
 
     except Exception as err:
         print("❗", err)
-        user_state.clear(); user_state["step"] = "start"
-        return {"role": "assistant",
-                "content": "Sorry, an internal error occurred.  Please start again."}
+        _state.clear(); _state["step"] = Step.START
+        return _say("Sorry, an internal error occurred.  Please start again.")
 
 # ─────────────────────────  file upload  ─────────────────────
-def handle_upload(file):
-    global uploaded_file_path
-    uploaded_file_path = file
+def handle_upload(file, sess):
+    sess["uploaded_file_path"] = file
+    if file:
+        extract_pdf(file)           # warm the cache so question #1 is instant
     # returning None avoids the “too many outputs” warning
     return
 
@@ -205,15 +309,19 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
     gr.Markdown("# JP Morgan Chase • Financial Assistant\n"
                 "Your personalised banking experience awaits 🚀")
 
+    session = gr.State(lambda: {"step": Step.START, "uploaded_file_path": None})
+
     chat = gr.ChatInterface(fn=bot,
                             chatbot=gr.Chatbot(type="messages"),
                             textbox=gr.Textbox(
                                 placeholder="Ask about your balance, "
-                                            "transactions, or savings products…"))
+                                            "transactions, or savings products…"),
+                            additional_inputs=[session])
 
-    gr.File(label="Upload Financial Document (PDF)",
-            file_types=[".pdf"],
-            type="filepath").change(handle_upload, None, None)
+    uploader = gr.File(label="Upload Financial Document (PDF)",
+                       file_types=[".pdf"],
+                       type="filepath")
+    uploader.change(handle_upload, [uploader, session], None)
 
 if __name__ == "__main__":
-    demo.launch(share=True)
\ No newline at end of file
+    demo.launch(share=True)
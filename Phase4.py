@@ -5,56 +5,158 @@
 """
 
 # ───────────────────────── IMPORTS & CONFIG ────────────────────────────
-import os, sqlite3, pdfplumber
-from datetime import datetime
+import hashlib, shelve
+import os, re, sqlite3, threading
 import gradio as gr
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-# ────────────────────────── GLOBAL STATE ───────────────────────────────
-user_state = {"step": "start"}           # simple FSM per session
-uploaded_file_path: str | None = None     # pdf currently in context
+# ────────────────────────── SHARED STATE ───────────────────────────────
+# per-session FSM/pdf state lives in a gr.State dict (see UI section);
+# only the extraction cache is process-wide.
+PDF_CACHE: dict[tuple[str, float], str] = {}  # (path, mtime) → extracted text
+PDF_DISK_CACHE = ".pdf_cache"                 # shelve store keyed by content hash
+# shelve's dbm backend corrupts under concurrent writers, and uploads run on
+# parallel Gradio worker threads — every open goes through this lock
+_PDF_DISK_LOCK = threading.Lock()
 
 # ──────────────────────────── HELPERS ──────────────────────────────────
 
-def db():
-    """Return a row‑dict sqlite connection (call with *with*)."""
-    conn = sqlite3.connect("customers.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+# one connection for the whole process – reconnecting (and re-compiling the
+# SQL) on every chat turn was the hot path.  cached_statements keeps the
+# compiled programs for the constant query strings below.
+CONN = sqlite3.connect("customers.db", check_same_thread=False, cached_statements=256)
+CONN.row_factory = sqlite3.Row
+CONN.execute("PRAGMA journal_mode=WAL")         # concurrent readers, fewer fsyncs
+CONN.execute("PRAGMA synchronous=NORMAL")
+CONN.execute("PRAGMA temp_store=MEMORY")
+CONN.execute("PRAGMA mmap_size=268435456")      # tables are tiny – serve reads via mmap
+
+# recent-tx query seeks the index instead of scanning + sorting per turn
+CONN.execute("CREATE INDEX IF NOT EXISTS ix_cust_phone ON customers(phone)")
+CONN.execute("CREATE INDEX IF NOT EXISTS ix_tx_cust_date ON transactions(customer_id, date DESC)")
+
+SQL_CUSTOMER_BY_PHONE = "SELECT id, first_name, last_name, zip_code, balance FROM customers WHERE phone=?"
+SQL_RECENT_TX = ("SELECT date, description, amount FROM transactions "
+                 "WHERE customer_id=? ORDER BY date DESC LIMIT 5")
+
+# keyword → intent tag, matched in one word-bounded scan instead of chained
+# substring tests ("closeness" no longer reads as an exit request)
+INTENT_TAGS = {"balance": "BAL", "transaction": "TX", "transactions": "TX",
+               "recent": "TX", "saving": "SAV", "savings": "SAV", "upload": "UP",
+               "bye": "EXIT", "exit": "EXIT", "close": "EXIT",
+               "thank": "EXIT", "thanks": "EXIT"}
+INTENT_RE = re.compile(r"\b(" + "|".join(INTENT_TAGS) + r")\b", re.I)
 
 
 def extract_pdf(path: str) -> str:
-    """Return first ≈8k chars of text from a PDF (token‑safe)."""
-    txt_parts = []
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            if (p := page.extract_text()):
-                txt_parts.append(p)
-    return "\n".join(txt_parts)[:8_000]
-
-
-def ask_llm(question: str, context: str) -> str:
-    """Send *question* plus *context* to GPT and return the answer."""
-    resp = client.chat.completions.create(
+    """Return first ≈8k chars of text from a PDF (token‑safe, cached)."""
+    key = (path, os.path.getmtime(path))
+    if key in PDF_CACHE:
+        return PDF_CACHE[key]
+    # re-uploads of the same demo PDF across restarts hit the disk cache
+    with open(path, "rb") as fh:
+        digest = hashlib.blake2b(fh.read(), digest_size=16).hexdigest()
+    with _PDF_DISK_LOCK, shelve.open(PDF_DISK_CACHE) as store:
+        if digest in store:
+            PDF_CACHE[key] = store[digest]
+            return PDF_CACHE[key]
+    txt_parts, total = [], 0
+    try:
+        import pymupdf  # C-backed – an order of magnitude faster for raw text
+        with pymupdf.open(path) as doc:
+            for page in doc:
+                if (p := page.get_text("text")):
+                    txt_parts.append(p)
+                    total += len(p)
+                if total >= 8_000:          # bound the cost of huge PDFs
+                    break
+    except ImportError:
+        import pdfplumber  # heavy – only pay for it if pymupdf is absent
+        with pdfplumber.open(path) as pdf:
+            for page in pdf.pages:
+                if (p := page.extract_text()):
+                    txt_parts.append(p)
+                    total += len(p) + 1
+                if total >= 8_000:          # no point extracting pages we discard
+                    break
+    text = "\n".join(txt_parts)[:8_000]
+    PDF_CACHE[key] = text
+    with _PDF_DISK_LOCK, shelve.open(PDF_DISK_CACHE) as store:
+        store[digest] = text
+    return text
+
+
+# repeat questions over the same context skip OpenAI entirely
+_LLM_CACHE: dict[tuple[str, str], str] = {}
+_LLM_CACHE_MAX = 512
+
+
+def _llm_key(question: str, context: str) -> tuple[str, str]:
+    return (question.strip().lower(),
+            hashlib.blake2b(context.encode(), digest_size=16).hexdigest())
+
+
+def _llm_cache_put(key: tuple[str, str], answer: str) -> None:
+    if answer:
+        if len(_LLM_CACHE) >= _LLM_CACHE_MAX:
+            _LLM_CACHE.pop(next(iter(_LLM_CACHE)))   # FIFO eviction
+        _LLM_CACHE[key] = answer
+
+
+async def ask_llm(question: str, context: str):
+    """Stream the GPT answer, yielding the growing text as chunks arrive."""
+    key = _llm_key(question, context)
+    if key in _LLM_CACHE:
+        yield _LLM_CACHE[key]
+        return
+    stream = await client.chat.completions.create(
         model="gpt-3.5-turbo",
-        temperature=0.4,
+        temperature=0,   # deterministic – makes cached answers reusable
         max_tokens=512,
+        stream=True,
         messages=[
             {"role": "system", "content": "You are a helpful financial assistant."},
             {"role": "user",    "content": f"Context:\n{context}\n\nQuestion:\n{question}"},
         ],
     )
-    return resp.choices[0].message.content.strip()
+    acc = ""
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content or ""
+        if delta:
+            acc += delta
+            yield acc
+    _llm_cache_put(key, acc.strip())
+
+
+async def _stream_reply(question: str, context: str):
+    """Wrap the token stream in ChatInterface message dicts."""
+    async for text in ask_llm(question, context):
+        yield {"role": "assistant", "content": text}
 
 # ─────────────────────────── CHAT LOGIC ────────────────────────────────
 
-def bot(user_msg: str, history):
-    """Gradio ChatInterface callback: (message:str, history:list) → dict"""
-    global uploaded_file_path
+async def bot(user_msg: str, history, session):
+    """Gradio ChatInterface callback – streams when the reply is a generator."""
+    reply = _bot_turn(user_msg, history, session)
+    if not hasattr(reply, "__aiter__"):
+        yield reply
+        return
+    try:
+        async for item in reply:
+            yield item
+    except Exception as err:  # stream failures happen outside the FSM's try
+        print("❗", err)
+        session.clear(); session["step"] = "start"
+        yield {"role": "assistant", "content": "Sorry – internal error. Please begin again."}
+
+
+def _bot_turn(user_msg: str, history, session):
+    """One FSM turn: (message, history, session dict) → dict | async generator"""
+    user_state = session           # mutated in place – gr.State keeps it per session
     msg   = user_msg.strip()
     lower = msg.lower()
     step  = user_state["step"]
@@ -94,17 +196,16 @@ def bot(user_msg: str, history):
 
         # ─────────── PHONE AUTH ───────────────
         if step == "await_phone":
-            with db() as conn:
-                row = conn.execute("SELECT id, first_name, last_name FROM customers WHERE phone=?", (msg,)).fetchone()
+            # cache the whole customer row at login — zip/balance turns become dict reads
+            row = CONN.execute(SQL_CUSTOMER_BY_PHONE, (msg,)).fetchone()
             if row:
-                user_state.update(customer_id=row["id"], first=row["first_name"], last=row["last_name"], step="await_zip")
+                user_state.update(customer_id=row["id"], first=row["first_name"], last=row["last_name"],
+                                  zip_code=row["zip_code"], balance=row["balance"], step="await_zip")
                 return {"role": "assistant", "content": "Thanks – now your **ZIP code**, please:"}
             return {"role": "assistant", "content": "❌ Phone not found. Try again:"}
 
         if step == "await_zip":
-            with db() as conn:
-                zip_ok = conn.execute("SELECT 1 FROM customers WHERE id=? AND zip_code=?", (user_state["customer_id"], msg)).fetchone()
-            if zip_ok:
+            if msg == user_state["zip_code"]:
                 user_state["step"] = "verified"
                 return {"role": "assistant",
                         "content": (f"✅ Verified. Welcome back, {user_state['first']} {user_state['last']}!\n"
@@ -115,29 +216,26 @@ def bot(user_msg: str, history):
         # ─────────── VERIFIED ACTIONS ─────────
         if step == "verified":
             cid = user_state["customer_id"]
+            tags = {INTENT_TAGS[m.lower()] for m in INTENT_RE.findall(msg)}
 
             # Balance
-            if "balance" in lower:
-                with db() as conn:
-                    bal = conn.execute("SELECT balance FROM customers WHERE id=?", (cid,)).fetchone()[0]
+            if "BAL" in tags:
+                bal = user_state["balance"]  # cached at login
                 return {"role": "assistant", "content": f"Your current balance is **${bal:,.2f}**."}
 
             # Recent transactions
-            if "transaction" in lower or "recent" in lower:
-                with db() as conn:
-                    rows = conn.execute("""SELECT date, description, amount
-                                        FROM transactions
-                                        WHERE customer_id=?
-                                        ORDER BY date DESC LIMIT 5""", (cid,)).fetchall()
+            if "TX" in tags:
+                cur = CONN.cursor()
+                cur.row_factory = None          # plain tuples beat Row name lookups here
+                rows = cur.execute(SQL_RECENT_TX, (cid,)).fetchall()
                 if not rows:
                     return {"role": "assistant", "content": "No recent transactions found."}
                 lines = ["Here are your last 5 transactions:"]
-                for r in rows:
-                    lines.append(f"- {r['date']}: {r['description']} (${r['amount']:.2f})")
+                lines += [f"- {d}: {desc} (${amt:.2f})" for d, desc, amt in rows]
                 return {"role": "assistant", "content": "\n".join(lines)}
 
             # Savings products
-            if "saving" in lower:
+            if "SAV" in tags:
                 return {"role": "assistant",
                         "content": ("We offer **Basic Savings**, **High‑Yield Savings** (4.5 % APY), and **Money‑Market Accounts**.\n"
                                      "Would you like the **application link**?")}
@@ -145,48 +243,52 @@ def bot(user_msg: str, history):
                 return {"role": "assistant", "content": "You can start an application here → <https://www.chase.com/personal/savings>"}
 
             # Invite user to upload PDF
-            if "upload" in lower and "pdf" in lower and not uploaded_file_path:
+            if "UP" in tags and "pdf" in lower and not user_state.get("pdf_text"):
                 return {"role": "assistant", "content": "Sure – please use the *Upload Financial Document* button below."}
 
-            # PDF Q&A when a file is already uploaded
-            if uploaded_file_path and uploaded_file_path.lower().endswith(".pdf"):
-                ctx = extract_pdf(uploaded_file_path)
-                answer = ask_llm(msg, ctx)
-                return {"role": "assistant", "content": answer}
+            # PDF Q&A when a file is already uploaded – greetings and other
+            # one-word messages fall through instead of spending an API call
+            if user_state.get("pdf_text") and len(msg.split()) >= 3:
+                return _stream_reply(msg, user_state["pdf_text"])
 
             # Exit gracefully
-            if any(k in lower for k in ("bye", "exit", "close", "thank")):
-                user_state.clear(); user_state["step"] = "start"; uploaded_file_path = None
+            if "EXIT" in tags:
+                user_state.clear(); user_state["step"] = "start"
                 return {"role": "assistant", "content": "Thank you for banking with JP Morgan Chase. Good‑bye!"}
 
             # Fallback
             return {"role": "assistant", "content": "I'm here to help with **balance**, **transactions**, **savings**, or PDF analysis. What can I do for you?"}
 
         # ───────── UNKNOWN STATE SAFETY NET ──────────
-        user_state.clear(); user_state["step"] = "start"; uploaded_file_path = None
+        user_state.clear(); user_state["step"] = "start"
         return {"role": "assistant", "content": "Something went wrong – let's start over."}
 
     except Exception as err:
         print("❗", err)
-        user_state.clear(); user_state["step"] = "start"; uploaded_file_path = None
+        user_state.clear(); user_state["step"] = "start"
         return {"role": "assistant", "content": "Sorry – internal error. Please begin again."}
 
 # ─────────────────────── FILE‑UPLOAD HANDLER ──────────────────────────
 
-def handle_upload(file):
-    """Remember the uploaded PDF path and tell user it's ready."""
-    global uploaded_file_path
+def handle_upload(file, session):
+    """Extract the uploaded PDF into the session and tell the user it's ready."""
     if file is None:
+        session.pop("pdf_text", None)
         return  # called when user removes a file
-    uploaded_file_path = getattr(file, "name", file)  # normalise tempfile ↦ path str
-    return gr.update(value="✅ File uploaded! Ask me anything about it." )
+    path = getattr(file, "name", file)  # normalise tempfile ↦ path str
+    session["pdf_text"] = extract_pdf(path)  # parse once, reuse every turn
+    return gr.update(value="✅ File uploaded! Ask me anything about it." )
 
 # ───────────────────────────── UI ──────────────────────────────────────
 with gr.Blocks(theme=gr.themes.Soft()) as demo:
     gr.Markdown("""# JP Morgan Chase • Financial Assistant
     *Your personalised banking experience awaits 🚀*""")
 
+    session = gr.State(lambda: {"step": "start"})   # fresh dict per browser session
+
     chat = gr.ChatInterface(fn=bot,
+                            additional_inputs=[session],
+                            concurrency_limit=32,   # turns overlap their OpenAI wait
                             chatbot=gr.Chatbot(type="messages"),
                             textbox=gr.Textbox(placeholder="Ask about your balance, transactions, savings, or say ‘upload pdf’…"))
 
@@ -194,8 +296,10 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
                         file_types=[".pdf"], type="filepath")
     # show a small helper message when upload completes
     helper_out = gr.Textbox(show_label=False, interactive=False)
-    upload_box.change(handle_upload, inputs=upload_box, outputs=helper_out)
+    upload_box.change(handle_upload, inputs=[upload_box, session], outputs=helper_out)
 
 # ──────────────────────────── MAIN ─────────────────────────────────────
 if __name__ == "__main__":
+    # without an explicit queue one blocked OpenAI call stalls every session
+    demo.queue(default_concurrency_limit=64, max_size=256)
     demo.launch(share=True)
@@ -8,64 +8,195 @@ The script is self‑contained – run `python financial_ai_agent.py`.
 """
 
 # ───────────────────────── imports & config ─────────────────────────
-import os, sqlite3, pdfplumber
-from datetime import datetime
+import asyncio
+import hashlib, shelve
+import os, re, sqlite3, threading
 import gradio as gr
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-# ─────────────────────────── globals ───────────────────────────────
-user_state: dict = {"step": "start"}                    # FSM
-uploaded_files: list[str] = []                            # multiple PDFs
+# ─────────────────────────── shared state ──────────────────────────
+# per-session FSM + upload list live in a gr.State dict (see UI build);
+# only the extraction cache below is process-wide.
 MAX_PDFS = 3                                              # soft limit
+CHUNK_CHARS = 2_000                                       # per-request context slice
+PDF_CACHE: dict[tuple[str, float], str] = {}              # (path, mtime) → text
+PDF_DISK_CACHE = ".pdf_cache"                             # shelve store, content-hash keyed
+# shelve's dbm backend corrupts under concurrent writers, and extract_pdf runs
+# on worker threads (to_thread gather, parallel uploads) — lock every open
+_PDF_DISK_LOCK = threading.Lock()
 
 # ────────────────────────── utilities ─────────────────────────────
 
-def db():
-    conn = sqlite3.connect("customers.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+# single persistent connection – connecting per turn re-parsed every query;
+# cached_statements retains the compiled programs for the constants below.
+CONN = sqlite3.connect("customers.db", check_same_thread=False, cached_statements=256)
+CONN.row_factory = sqlite3.Row
+CONN.execute("PRAGMA journal_mode=WAL")         # concurrent readers, fewer fsyncs
+CONN.execute("PRAGMA synchronous=NORMAL")
+CONN.execute("PRAGMA temp_store=MEMORY")
+CONN.execute("PRAGMA mmap_size=268435456")      # tables are tiny – serve reads via mmap
+
+# recent-tx query seeks the index instead of scanning + sorting per turn
+CONN.execute("CREATE INDEX IF NOT EXISTS ix_cust_phone ON customers(phone)")
+CONN.execute("CREATE INDEX IF NOT EXISTS ix_tx_cust_date ON transactions(customer_id, date DESC)")
+
+SQL_CUSTOMER_BY_PHONE = "SELECT id, first_name, last_name, zip_code FROM customers WHERE phone = ?"
+SQL_BALANCE_BY_ID = "SELECT balance FROM customers WHERE id=?"
+SQL_RECENT_TX = ("SELECT date, description, amount FROM transactions "
+                 "WHERE customer_id=? ORDER BY date DESC LIMIT 5")
+
+# keyword → intent tag, matched in one word-bounded scan instead of chained
+# substring tests ("closeness" no longer reads as an exit request)
+INTENT_TAGS = {"balance": "BAL", "transaction": "TX", "transactions": "TX",
+               "recent": "TX", "saving": "SAV", "savings": "SAV",
+               "bye": "EXIT", "exit": "EXIT", "close": "EXIT",
+               "thank": "EXIT", "thanks": "EXIT"}
+INTENT_RE = re.compile(r"\b(" + "|".join(INTENT_TAGS) + r")\b", re.I)
+# questions that should hit the uploaded documents; everything else is
+# answered locally by follow_up() without an API call
+PDF_QA_RE = re.compile("pdf|report|document|statement|profit|revenue|expense"
+                       "|income|loss|margin|summary|detail|explain|analy")
 
 
 def extract_pdf(path: str) -> str:
-    """Return <= 8k chars of raw text from the PDF."""
-    txt = []
-    with pdfplumber.open(path) as pdf:
-        for pg in pdf.pages:
-            if (t := pg.extract_text()):
-                txt.append(t)
-    return "\n".join(txt)[:8_000]
-
-
-def ask_llm(question: str, context: str) -> str:
-    rsp = client.chat.completions.create(
+    """Return <= 8k chars of raw text from the PDF (cached per path+mtime)."""
+    key = (path, os.path.getmtime(path))
+    if key in PDF_CACHE:
+        return PDF_CACHE[key]
+    # re-uploads of the same demo PDF across restarts hit the disk cache
+    with open(path, "rb") as fh:
+        digest = hashlib.blake2b(fh.read(), digest_size=16).hexdigest()
+    with _PDF_DISK_LOCK, shelve.open(PDF_DISK_CACHE) as store:
+        if digest in store:
+            PDF_CACHE[key] = store[digest]
+            return PDF_CACHE[key]
+    txt, total = [], 0
+    try:
+        import pymupdf  # C-backed – far faster than pdfplumber for plain text
+        with pymupdf.open(path) as doc:
+            for pg in doc:
+                if (t := pg.get_text("text")):
+                    txt.append(t)
+                    total += len(t)
+                if total >= 8_000:          # early exit keeps huge PDFs bounded
+                    break
+    except ImportError:
+        import pdfplumber  # heavy – only pay for it if pymupdf is absent
+        with pdfplumber.open(path) as pdf:
+            for pg in pdf.pages:
+                if (t := pg.extract_text()):
+                    txt.append(t)
+                    total += len(t) + 1
+                if total >= 8_000:          # no point extracting pages we discard
+                    break
+    text = "\n".join(txt)[:8_000]
+    PDF_CACHE[key] = text
+    with _PDF_DISK_LOCK, shelve.open(PDF_DISK_CACHE) as store:
+        store[digest] = text
+    return text
+
+
+# repeat questions over the same context skip OpenAI entirely
+_LLM_CACHE: dict[tuple[str, str], str] = {}
+_LLM_CACHE_MAX = 512
+
+
+def _llm_key(question: str, context: str) -> tuple[str, str]:
+    return (question.strip().lower(),
+            hashlib.blake2b(context.encode(), digest_size=16).hexdigest())
+
+
+def _llm_cache_put(key: tuple[str, str], answer: str) -> None:
+    if answer:
+        if len(_LLM_CACHE) >= _LLM_CACHE_MAX:
+            _LLM_CACHE.pop(next(iter(_LLM_CACHE)))   # FIFO eviction
+        _LLM_CACHE[key] = answer
+
+
+async def ask_llm(question: str, context: str) -> str:
+    key = _llm_key(question, context)
+    if key in _LLM_CACHE:
+        return _LLM_CACHE[key]
+    rsp = await client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        temperature=0,   # deterministic – makes cached answers reusable
+        max_tokens=512,
+        messages=[
+            {"role": "system", "content": "You are a helpful financial assistant."},
+            {"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{question}"},
+        ],
+    )
+    answer = rsp.choices[0].message.content.strip()
+    _llm_cache_put(key, answer)
+    return answer
+
+
+async def stream_llm(question: str, context: str):
+    """Streaming variant of ask_llm – yields the growing answer text."""
+    key = _llm_key(question, context)
+    if key in _LLM_CACHE:
+        yield _LLM_CACHE[key]
+        return
+    stream = await client.chat.completions.create(
         model="gpt-3.5-turbo",
-        temperature=0.4,
+        temperature=0,   # deterministic – makes cached answers reusable
         max_tokens=512,
+        stream=True,
         messages=[
             {"role": "system", "content": "You are a helpful financial assistant."},
             {"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{question}"},
         ],
     )
-    return rsp.choices[0].message.content.strip()
+    acc = ""
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content or ""
+        if delta:
+            acc += delta
+            yield acc
+    _llm_cache_put(key, acc.strip())
 
 
-def follow_up() -> str:
+async def _stream_reply(question: str, context: str, suffix: str):
+    """Stream partial answers, then append *suffix* to the final message."""
+    text = ""
+    async for text in stream_llm(question, context):
+        yield {"role": "assistant", "content": text}
+    yield {"role": "assistant", "content": text + suffix}
+
+
+_FOLLOW_UP_NO_TIP = ("I'm here to help with **balance**, **transactions**, **savings**, "
+                     "or **PDF analysis**.  What can I do for you?")
+_FOLLOW_UP_WITH_TIP = _FOLLOW_UP_NO_TIP + "  _(Tip: type **upload** to attach a PDF.)_"
+
+
+def follow_up(n_files: int) -> str:
     """Standard follow‑up prompt after most answers."""
-    parts = [
-        "I'm here to help with **balance**, **transactions**, **savings**,",
-        "or **PDF analysis**.  What can I do for you?",
-    ]
-    if len(uploaded_files) < MAX_PDFS:
-        parts.append(" _(Tip: type **upload** to attach a PDF.)_")
-    return " ".join(parts)
+    return _FOLLOW_UP_WITH_TIP if n_files < MAX_PDFS else _FOLLOW_UP_NO_TIP
 
 # ─────────────────────── chat handler (FSM) ───────────────────────
 
-def bot(user_msg: str, history):
+async def bot(user_msg: str, history, session):
+    """ChatInterface callback – streams when the reply is a generator."""
+    reply = await _bot_turn(user_msg, history, session)
+    if not hasattr(reply, "__aiter__"):
+        yield reply
+        return
+    try:
+        async for item in reply:
+            yield item
+    except Exception as err:  # stream failures happen outside the FSM's try
+        print("❗", err)
+        session.clear(); session["step"] = "start"
+        yield {"role": "assistant", "content": "Sorry, an internal error occurred.  Please start again."}
+
+
+async def _bot_turn(user_msg: str, history, session):
+    user_state = session           # mutated in place – gr.State keeps it per session
+    uploaded_files = session.setdefault("files", [])
     msg = user_msg.strip()
     lower = msg.lower()
     step = user_state.get("step", "start")
@@ -112,29 +243,22 @@ def bot(user_msg: str, history):
 
         # ───────────── existing‑customer auth ─────────────
         if step == "await_phone":
-            with db() as conn:
-                row = conn.execute(
-                    "SELECT id, first_name, last_name FROM customers WHERE phone = ?",
-                    (msg,),
-                ).fetchone()
+            row = CONN.execute(SQL_CUSTOMER_BY_PHONE, (msg,)).fetchone()
             if not row:
                 return {"role": "assistant", "content": "Phone not found.  Please try again:"}
             user_state.update(
                 customer_id=row["id"],
                 first=row["first_name"],
                 last=row["last_name"],
+                zip=row["zip_code"],    # cached so await_zip needs no SELECT
                 step="await_zip",
             )
             return {"role": "assistant", "content": "Thanks.  Now your ZIP code:"}
 
         if step == "await_zip":
-            with db() as conn:
-                zip_code = conn.execute(
-                    "SELECT zip_code FROM customers WHERE id = ?",
-                    (user_state["customer_id"],),
-                ).fetchone()["zip_code"]
-            if msg != zip_code:
+            if msg != user_state["zip"]:
                 return {"role": "assistant", "content": "❌ ZIP incorrect.  Try again:"}
+            user_state.pop("zip")
             user_state["step"] = "verified"
             return {
                 "role": "assistant",
@@ -148,6 +272,7 @@ def bot(user_msg: str, history):
         # ───────────── verified user actions ─────────────
         if step == "verified":
             cid = user_state["customer_id"]
+            tags = {INTENT_TAGS[m.lower()] for m in INTENT_RE.findall(msg)}
 
             # prompt to upload
             if lower == "upload":
@@ -160,58 +285,62 @@ def bot(user_msg: str, history):
                 }
 
             # balance
-            if "balance" in lower:
-                with db() as conn:
-                    bal = conn.execute("SELECT balance FROM customers WHERE id=?", (cid,)).fetchone()["balance"]
+            if "BAL" in tags:
+                bal = CONN.execute(SQL_BALANCE_BY_ID, (cid,)).fetchone()["balance"]
                 return {
                     "role": "assistant",
-                    "content": f"Your current balance is **${bal:,.2f}**.\n\n{follow_up()}",
+                    "content": f"Your current balance is **${bal:,.2f}**.\n\n{follow_up(len(uploaded_files))}",
                 }
 
             # recent transactions
-            if "transaction" in lower or "recent" in lower:
-                with db() as conn:
-                    rows = conn.execute(
-                        """SELECT date, description, amount FROM transactions
-                        WHERE customer_id=? ORDER BY date DESC LIMIT 5""",
-                        (cid,),
-                    ).fetchall()
+            if "TX" in tags:
+                cur = CONN.cursor()
+                cur.row_factory = None          # plain tuples beat Row name lookups here
+                rows = cur.execute(SQL_RECENT_TX, (cid,)).fetchall()
                 if not rows:
-                    return {"role": "assistant", "content": "No recent transactions found.\n\n" + follow_up()}
+                    return {"role": "assistant", "content": "No recent transactions found.\n\n" + follow_up(len(uploaded_files))}
                 lines = ["Here are your last 5 transactions:"]
-                lines += [f"- {r['date']}: {r['description']} (${r['amount']:.2f})" for r in rows]
-                return {"role": "assistant", "content": "\n".join(lines) + "\n\n" + follow_up()}
+                lines += [f"- {d}: {desc} (${amt:.2f})" for d, desc, amt in rows]
+                return {"role": "assistant", "content": "\n".join(lines) + "\n\n" + follow_up(len(uploaded_files))}
 
             # offer savings products
-            if "saving" in lower:
+            if "SAV" in tags:
                 return {
                     "role": "assistant",
                     "content": (
                         "We offer Basic Savings, **High‑Yield Savings** (up to 4.5 % APY), "
                         "and Money‑Market Accounts.  Interested in an **application link**?\n\n"
-                        + follow_up()
+                        + follow_up(len(uploaded_files))
                     ),
                 }
 
             # user says yes to link
             if lower in ("yes", "yes please", "yes, please", "yep"):
-                return {"role": "assistant", "content": "You can start an application here: <https://www.chase.com/personal/savings>\n\n" + follow_up()}
+                return {"role": "assistant", "content": "You can start an application here: <https://www.chase.com/personal/savings>\n\n" + follow_up(len(uploaded_files))}
 
             # PDF question / analysis
-            if uploaded_files and any(k in lower for k in ("pdf", "report", "profit", "revenue", "expense", "summary", "detail")):
-                # build combined context (truncate each to 8k chars)
-                ctx_chunks = [extract_pdf(p) for p in uploaded_files]
+            if uploaded_files and PDF_QA_RE.search(lower):
+                # extract concurrently off the event loop (cache makes repeats free)
+                ctx_chunks = await asyncio.gather(
+                    *(asyncio.to_thread(extract_pdf, p) for p in uploaded_files)
+                )
                 ctx = "\n\n".join(ctx_chunks)
-                answer = ask_llm(msg, ctx)
-                return {"role": "assistant", "content": answer + "\n\n" + follow_up()}
+                if len(ctx) > CHUNK_CHARS:
+                    # map-reduce: short parallel calls beat one giant prompt
+                    pieces = [ctx[i:i + CHUNK_CHARS] for i in range(0, len(ctx), CHUNK_CHARS)]
+                    partials = await asyncio.gather(*(ask_llm(msg, p) for p in pieces))
+                    ctx = "\n\n".join(f"Partial answer {i + 1}: {p}"
+                                       for i, p in enumerate(partials))
+                # stream the (reduce) answer for fast time-to-first-token
+                return _stream_reply(msg, ctx, "\n\n" + follow_up(len(uploaded_files)))
 
             # exit
-            if any(w in lower for w in ("bye", "exit", "close", "thank")):
+            if "EXIT" in tags:
                 user_state.clear(); user_state["step"] = "start"
                 return {"role": "assistant", "content": "Thanks for banking with JP Morgan Chase.  Goodbye!"}
 
             # fallback
-            return {"role": "assistant", "content": follow_up()}
+            return {"role": "assistant", "content": follow_up(len(uploaded_files))}
 
         # ───────────── unknown state fallback ─────────────
         user_state.clear(); user_state["step"] = "start"
@@ -224,12 +353,14 @@ def bot(user_msg: str, history):
 
 # ───────────────────────── file upload ───────────────────────────
 
-def handle_upload(file_path):
+def handle_upload(file_path, session):
     if not file_path:
         return gr.update()
+    uploaded_files = session.setdefault("files", [])
     if len(uploaded_files) >= MAX_PDFS:
         return gr.update(value="❌ Maximum PDF limit reached (3).  Remove a file first.")
     uploaded_files.append(file_path)
+    extract_pdf(file_path)  # pay the parse cost once, at upload
     short = os.path.basename(file_path)
     return gr.update(value=f"✅ {short} uploaded.  Ask me a question when ready.")
 
@@ -237,19 +368,26 @@ def handle_upload(file_path):
 with gr.Blocks(theme=gr.themes.Soft()) as demo:
     gr.Markdown("# JP Morgan Chase • Financial Assistant\nYour personalised banking experience awaits 🚀")
 
+    session = gr.State(lambda: {"step": "start", "files": []})  # per browser session
+
     chat = gr.ChatInterface(
         fn=bot,
+        additional_inputs=[session],
+        concurrency_limit=32,   # turns overlap their OpenAI wait
         chatbot=gr.Chatbot(type="messages"),
         textbox=gr.Textbox(placeholder="Ask about your balance, transactions, savings, or say 'upload'…"),
     )
 
     status = gr.Textbox(label="Upload status", interactive=False)
 
-    gr.File(
+    uploader = gr.File(
         label="Upload Financial Document (PDF)",
         file_types=[".pdf"],
         type="filepath",
-    ).change(handle_upload, outputs=status)
+    )
+    uploader.change(handle_upload, inputs=[uploader, session], outputs=status)
 
 if __name__ == "__main__":
+    # without an explicit queue one blocked OpenAI call stalls every session
+    demo.queue(default_concurrency_limit=64, max_size=256)
     demo.launch(share=True)
@@ -8,51 +8,394 @@ Run:  python financial_ai_agent.py
 """
 
 # ────────────────────────── imports & config ──────────────────────────
-import os, sqlite3, pdfplumber
+import asyncio
+import hashlib, io, json, re, tempfile, time
+import os, sqlite3
 import gradio as gr
+import numpy as np
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))        # Batch API path
+aclient = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))  # interactive turns
 
 DB               = "customers.db"
-MAX_CHARS        = 8_000              # max context sent to GPT
-state            = {"step": "start"}  # simple FSM
-pdf_text: str | None = None           # extracted text of uploaded file
+MAX_CHARS        = 8_000              # per-question context budget for GPT
+EXTRACT_CAP      = 120_000            # how much text to pull for the retrieval index
+# per-session FSM + pdf text live in a gr.State dict (see UI build)
 
 # ────────────────────────── helpers ──────────────────────────
-def db():
-    c = sqlite3.connect(DB); c.row_factory = sqlite3.Row; return c
+# one connection for the whole process – per-turn connects re-parsed every
+# query.  The constant strings below stay hot in the statement cache.
+_CONN = sqlite3.connect(DB, check_same_thread=False, cached_statements=256)
+_CONN.row_factory = sqlite3.Row
+_CONN.execute("PRAGMA journal_mode=WAL")
+_CONN.execute("PRAGMA synchronous=NORMAL")
+
+SQL_CUSTOMER_BY_PHONE = ("SELECT id, first_name, last_name, zip_code, balance "
+                         "FROM customers WHERE phone=?")
+SQL_RECENT_TX = ("SELECT date, description, amount FROM transactions "
+                 "WHERE customer_id=? ORDER BY date DESC LIMIT 5")
+
+_PDF_CACHE: dict[str, str] = {}       # sha-256 of file bytes → extracted text
 
 def extract(path: str) -> str:
-    chunks = []
-    with pdfplumber.open(path) as pdf:
-        for p in pdf.pages:
-            txt = p.extract_text()
-            if txt: chunks.append(txt)
-    return "\n".join(chunks)[:MAX_CHARS]
-
-def ask_llm(question: str, context: str) -> str:
-    rsp = client.chat.completions.create(
+    with open(path, "rb") as fh:
+        data = fh.read()
+    h = hashlib.sha256(data).hexdigest()
+    if h in _PDF_CACHE:               # re-upload of a known file: skip parsing
+        return _PDF_CACHE[h]
+    chunks, total = [], 0
+    try:
+        import pymupdf  # MuPDF's C extractor skips non-text operators entirely
+        with pymupdf.open(stream=data, filetype="pdf") as doc:
+            for p in doc:
+                txt = p.get_text("text")
+                if txt:
+                    chunks.append(txt)
+                    total += len(txt) + 1
+                if total >= EXTRACT_CAP:  # pages past the cap are never parsed
+                    break
+    except ImportError:
+        import pdfplumber
+        with pdfplumber.open(io.BytesIO(data)) as pdf:
+            for p in pdf.pages:           # lazy – unread pages stay unmaterialized
+                txt = p.extract_text()
+                p.flush_cache()           # drop the page's parsed-object cache now,
+                                          # keeping peak memory at one page
+                if txt:
+                    chunks.append(txt)
+                    total += len(txt) + 1
+                if total >= EXTRACT_CAP:
+                    break
+    _PDF_CACHE[h] = "\n".join(chunks)[:EXTRACT_CAP]
+    return _PDF_CACHE[h]
+
+# repeat questions about the same document are served locally
+_LLM_CACHE: dict[tuple[str, str], str] = {}
+_LLM_CACHE_MAX = 512
+
+# turns arriving within the window share one LLM round trip
+_BATCH_WINDOW = 0.25      # seconds to wait for a burst
+_BATCH_MAX = 8            # questions per combined request
+_PENDING: list[tuple[str, str, asyncio.Future]] = []
+_FLUSH_TASK: asyncio.Task | None = None
+_NUMBERED_RE = re.compile(r"\s*(\d+)\s*[:.)]\s*(.*)")
+
+
+async def _ask_once(question: str, context: str) -> str:
+    rsp = await aclient.chat.completions.create(
         model="gpt-3.5-turbo",
         temperature=0.4,
         max_tokens=500,
         messages=[
-            {"role": "system", "content": "You are a helpful financial assistant."},
-            {"role": "user",   "content": f"Context:\n{context}\n\nQuestion:\n{question}"},
+            # document goes in the system prompt as a stable prefix so OpenAI's
+            # automatic prompt caching kicks in on repeat questions
+            {"role": "system",
+             "content": f"You are a helpful financial assistant.\n\nDocument:\n{context}"},
+            {"role": "user",   "content": question},
         ],
     )
     return rsp.choices[0].message.content.strip()
 
-def again() -> str:
-    return ("Anything else I can help with? (balance • transactions • savings "
-            "— or type **upload** to attach a PDF | **exit** to leave)")
+
+def _split_numbered(text: str, n: int) -> list[str]:
+    """Split a combined '1: … 2: …' answer back into per-question parts."""
+    answers, cur = [""] * n, None
+    for line in text.splitlines():
+        m = _NUMBERED_RE.match(line)
+        if m and 1 <= int(m.group(1)) <= n:
+            cur = int(m.group(1)) - 1
+            answers[cur] = m.group(2)
+        elif cur is not None:
+            answers[cur] += "\n" + line
+    return [a.strip() or text.strip() for a in answers]
+
+
+async def _flush_pending() -> None:
+    global _FLUSH_TASK
+    await asyncio.sleep(_BATCH_WINDOW)          # let a burst accumulate
+    pending, _PENDING[:] = _PENDING[:], []
+    by_ctx: dict[str, list[tuple[str, asyncio.Future]]] = {}
+    for q, ctx, fut in pending:
+        by_ctx.setdefault(ctx, []).append((q, fut))
+    for ctx, items in by_ctx.items():
+        for i in range(0, len(items), _BATCH_MAX):
+            chunk = items[i:i + _BATCH_MAX]
+            if len(chunk) == 1:
+                # lone turn — hand the request back (None) so the caller can
+                # stream it instead of blocking on a whole-answer call here
+                if not chunk[0][1].done():
+                    chunk[0][1].set_result(None)
+                continue
+            try:
+                numbered = "\n".join(f"{j + 1}: {q}"
+                                     for j, (q, _) in enumerate(chunk))
+                combined = await _ask_once(
+                    "Answer each question separately. Prefix every answer "
+                    "with its number and a colon.\n" + numbered, ctx)
+                answers = _split_numbered(combined, len(chunk))
+            except Exception as err:
+                for _, fut in chunk:
+                    if not fut.done():
+                        fut.set_exception(err)
+                continue
+            for (_, fut), ans in zip(chunk, answers):
+                if not fut.done():
+                    fut.set_result(ans)
+    # turns that arrived during the drain above found _FLUSH_TASK still
+    # running and did not schedule — re-arm here or they would wait forever
+    if _PENDING:
+        _FLUSH_TASK = asyncio.create_task(_flush_pending())
+
+
+# ───────────── semantic retrieval over long documents ─────────────
+# documents longer than MAX_CHARS are chunked, embedded once, and each
+# question only ships its top-3 most similar passages to GPT
+_EMB_CACHE: dict[str, tuple[list[str], "np.ndarray"]] = {}
+_CHUNK_CHARS = 2_000                  # ≈500 tokens per passage
+_TOP_K = 3
+
+
+def _chunk_text(text: str) -> list[str]:
+    """Split on paragraph boundaries into ≈_CHUNK_CHARS passages."""
+    chunks, cur, cur_len = [], [], 0
+    for para in text.split("\n\n"):
+        cur.append(para)
+        cur_len += len(para) + 2
+        if cur_len >= _CHUNK_CHARS:
+            chunks.append("\n\n".join(cur))
+            cur, cur_len = [], 0
+    if cur:
+        chunks.append("\n\n".join(cur))
+    return chunks
+
+
+# embeddings API limits: ≤2048 inputs and a per-request token budget;
+# ~4 chars/token is close enough for packing without a tokenizer dependency
+_EMBED_MAX_ITEMS = 2_048
+_EMBED_MAX_TOKENS = 250_000
+
+
+def _embed_batched(chunks: list[str]) -> list[list[float]]:
+    """Embed all chunks in as few HTTP requests as the API limits allow."""
+    out: list[list[float]] = []
+    batch: list[str] = []
+    batch_tokens = 0
+    for chunk in chunks:
+        est = len(chunk) // 4 + 1
+        if batch and (len(batch) >= _EMBED_MAX_ITEMS
+                      or batch_tokens + est > _EMBED_MAX_TOKENS):
+            rsp = client.embeddings.create(model="text-embedding-3-small", input=batch)
+            out.extend(d.embedding for d in rsp.data)
+            batch, batch_tokens = [], 0
+        batch.append(chunk)
+        batch_tokens += est
+    if batch:
+        rsp = client.embeddings.create(model="text-embedding-3-small", input=batch)
+        out.extend(d.embedding for d in rsp.data)
+    return out
+
+
+def _build_index(text: str) -> tuple[list[str], "np.ndarray"]:
+    h = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+    if h in _EMB_CACHE:
+        return _EMB_CACHE[h]
+    chunks = _chunk_text(text)
+    # float32 halves memory traffic; rows pre-normalized so query time is one GEMV
+    E = np.asarray(_embed_batched(chunks), dtype=np.float32)
+    E /= np.linalg.norm(E, axis=1, keepdims=True)
+    _EMB_CACHE[h] = (chunks, E)
+    return _EMB_CACHE[h]
+
+
+def _retrieve(question: str, text: str) -> str:
+    """Reduce *text* to the _TOP_K passages most similar to *question*."""
+    if len(text) <= MAX_CHARS:
+        return text
+    try:
+        chunks, E = _build_index(text)
+        q = np.asarray(client.embeddings.create(model="text-embedding-3-small",
+                                                input=[question]).data[0].embedding,
+                       dtype=np.float32)
+        sims = E @ (q / (np.linalg.norm(q) or 1.0))   # one BLAS GEMV for all chunks
+        k = min(_TOP_K, len(chunks))
+        top = np.argpartition(-sims, k - 1)[:k]
+        return "\n\n".join(chunks[i] for i in sorted(top))
+    except Exception as err:                 # embeddings unavailable → old prefix
+        print("❗ retrieval failed:", err)
+        return text[:MAX_CHARS]
+
+
+def _llm_key(question: str, context: str) -> tuple[str, str]:
+    return (question.strip().lower(),
+            hashlib.blake2b(context.encode(), digest_size=16).hexdigest())
+
+
+def _llm_cache_put(key: tuple[str, str], answer: str) -> None:
+    if answer:
+        if len(_LLM_CACHE) >= _LLM_CACHE_MAX:
+            _LLM_CACHE.pop(next(iter(_LLM_CACHE)))   # FIFO eviction
+        _LLM_CACHE[key] = answer
+
+
+async def _join_batch(question: str, context: str) -> str | None:
+    """Register the turn in the batching window and wait for the flush.
+    Returns the combined answer, or None when the turn was still alone at
+    flush time — the caller then issues (and may stream) its own request."""
+    global _FLUSH_TASK
+    fut: asyncio.Future = asyncio.get_running_loop().create_future()
+    _PENDING.append((question, context, fut))
+    if _FLUSH_TASK is None or _FLUSH_TASK.done():
+        _FLUSH_TASK = asyncio.create_task(_flush_pending())
+    return await fut
+
+
+async def ask_llm(question: str, context: str) -> str:
+    # _retrieve blocks on sync embedding calls — keep them off the event loop
+    context = await asyncio.to_thread(_retrieve, question, context)
+    key = _llm_key(question, context)
+    if key in _LLM_CACHE:
+        return _LLM_CACHE[key]
+    answer = await _join_batch(question, context)
+    if answer is None:                       # alone in the window
+        answer = await _ask_once(question, context)
+    _llm_cache_put(key, answer)
+    return answer
+
+
+async def _stream_reply(question: str, context: str):
+    """Every turn waits out the batching window: a burst shares one combined
+    request, a turn that is still alone streams token-by-token."""
+    context = await asyncio.to_thread(_retrieve, question, context)
+    key = _llm_key(question, context)
+    if key in _LLM_CACHE:
+        yield {"role": "assistant", "content": _LLM_CACHE[key] + "\n\n" + _AGAIN}
+        return
+    answer = await _join_batch(question, context)
+    if answer is not None:                   # burst — the batched answer arrives whole
+        _llm_cache_put(key, answer)
+        yield {"role": "assistant", "content": answer + "\n\n" + _AGAIN}
+        return
+    stream = await aclient.chat.completions.create(
+        model="gpt-3.5-turbo",
+        temperature=0.4,
+        max_tokens=500,
+        stream=True,
+        messages=[
+            {"role": "system",
+             "content": f"You are a helpful financial assistant.\n\nDocument:\n{context}"},
+            {"role": "user",   "content": question},
+        ],
+    )
+    acc = ""
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content or ""
+        if delta:
+            acc += delta
+            yield {"role": "assistant", "content": acc}
+    _llm_cache_put(key, acc.strip())
+    yield {"role": "assistant", "content": acc.strip() + "\n\n" + _AGAIN}
+
+# canned questions for the non-interactive "Analyze PDF (batch)" button
+BATCH_FAQ = [
+    "Summarize this document in three bullet points.",
+    "What are the main revenue drivers?",
+    "List any notable risks mentioned.",
+]
+
+def ask_llm_batch(questions: list[str], context: str) -> list[str]:
+    """Answer *questions* via the Batch API – ~half the interactive price,
+    at the cost of minutes instead of seconds. Used for offline analysis."""
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as fh:
+        for i, q in enumerate(questions):
+            # the raw extraction can run to EXTRACT_CAP — far past the model's
+            # context window — so each request ships only its top passages
+            ctx = _retrieve(q, context)
+            fh.write(json.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": "gpt-3.5-turbo",
+                    "temperature": 0.4,
+                    "max_tokens": 500,
+                    "messages": [
+                        {"role": "system",
+                         "content": f"You are a helpful financial assistant.\n\nDocument:\n{ctx}"},
+                        {"role": "user", "content": q},
+                    ],
+                },
+            }) + "\n")
+        batch_path = fh.name
+    with open(batch_path, "rb") as fh:
+        batch_file = client.files.create(file=fh, purpose="batch")
+    batch = client.batches.create(input_file_id=batch_file.id,
+                                  endpoint="/v1/chat/completions",
+                                  completion_window="24h")
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(5)
+        batch = client.batches.retrieve(batch.id)
+    if batch.status != "completed":
+        return [f"Batch {batch.status} — please retry."] * len(questions)
+    answers = [""] * len(questions)
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        rec = json.loads(line)
+        answers[int(rec["custom_id"])] = \
+            rec["response"]["body"]["choices"][0]["message"]["content"].strip()
+    return answers
+
+# pure string – build once, not on every reply
+_AGAIN = ("Anything else I can help with? (balance • transactions • savings "
+          "— or type **upload** to attach a PDF | **exit** to leave)")
+
+
+def _do_balance(state):
+    bal = state["balance"]  # cached at login
+    return {"role": "assistant", "content": f"Your balance is **${bal:,.2f}**.\n\n{_AGAIN}"}
+
+def _do_tx(state):
+    tx = _CONN.execute(SQL_RECENT_TX, (state["cid"],)).fetchall()
+    if not tx:
+        return {"role": "assistant", "content": "No recent transactions.\n\n"+_AGAIN}
+    lines = ["Here are the last 5 transactions:"]
+    lines += [f"- {t['date']}: {t['description']} (${t['amount']:.2f})" for t in tx]
+    return {"role": "assistant", "content": "\n".join(lines)+"\n\n"+_AGAIN}
+
+def _do_savings(state):
+    return {"role": "assistant",
+            "content": ("We offer Basic Savings, **High-Yield Savings** (4.5 % APY) "
+                        "and Money-Market Accounts. Reply **yes** for the link.\n\n"+_AGAIN)}
+
+# keyword → (handler, requires verified customer); scanned once per turn
+_INTENTS = {
+    "balance":     (_do_balance, True),
+    "transaction": (_do_tx,      True),
+    "recent":      (_do_tx,      True),
+    "saving":      (_do_savings, False),
+}
 
 # ────────────────────────── chat handler ──────────────────────────
-def chat(user, hist):
-    global pdf_text
-    msg, low = user.strip(), user.strip().lower()
+async def chat(user, hist, session):
+    """ChatInterface callback – streams when the reply is a generator."""
+    reply = _chat_turn(user, hist, session)
+    if not hasattr(reply, "__aiter__"):
+        yield reply
+        return
+    try:
+        async for item in reply:
+            yield item
+    except Exception as err:  # stream failures happen outside the FSM's try
+        print("❗", err)
+        session.clear(); session["step"] = "start"
+        yield {"role": "assistant", "content": "Internal error — please start again."}
+
+
+def _chat_turn(user, hist, session):
+    state = session            # mutated in place – gr.State keeps it per session
+    msg = user.strip()
+    low = msg.lower()          # computed once, reused by every branch
     step = state.get("step", "start")
 
     try:
@@ -88,28 +431,26 @@ def chat(user, hist):
             name = state.pop("prospect_name")
             state.clear(); state["step"] = "ok_new"
             return {"role": "assistant",
-                    "content": (f"Thanks {name}! A banker will contact you soon.\n\n{again()}")}
+                    "content": (f"Thanks {name}! A banker will contact you soon.\n\n{_AGAIN}")}
 
         # ────────── phone verification ──────────
         if step == "phone":
-            with db() as c:
-                row = c.execute(
-                    "SELECT id, first_name, last_name FROM customers WHERE phone=?",
-                    (msg,)).fetchone()
+            row = _CONN.execute(SQL_CUSTOMER_BY_PHONE, (msg,)).fetchone()
             if not row:
                 return {"role": "assistant", "content": "Number not found — try again:"}
-            state.update(cid=row["id"], fn=row["first_name"], ln=row["last_name"], step="zip")
+            # one round trip fetches everything the session will need
+            state.update(cid=row["id"], fn=row["first_name"], ln=row["last_name"],
+                         zip_true=row["zip_code"], balance=row["balance"], step="zip")
             return {"role": "assistant", "content": "ZIP code:"}
 
         # ────────── ZIP verification ──────────
         if step == "zip":
-            with db() as c:
-                true_zip = c.execute("SELECT zip_code FROM customers WHERE id=?", (state["cid"],)).fetchone()["zip_code"]
-            if msg != true_zip:
+            if msg != state["zip_true"]:
                 return {"role": "assistant", "content": "❌ Wrong ZIP — try again:"}
+            state.pop("zip_true")
             state["step"] = "ok_exist"
             return {"role": "assistant",
-                    "content": f"✅ Verified. Welcome back {state['fn']}!\n{again()}"}
+                    "content": f"✅ Verified. Welcome back {state['fn']}!\n{_AGAIN}"}
 
         # ────────── main assistant actions ──────────
         if step in ("ok_exist", "ok_new"):
@@ -124,77 +465,64 @@ def chat(user, hist):
                 return {"role": "assistant",
                         "content": "Click **Upload** below, then ask me about the file."}
 
-            # balance / transactions available only for verified existing customers
-            if step == "ok_exist":
-                if "balance" in low:
-                    with db() as c:
-                        bal = c.execute("SELECT balance FROM customers WHERE id=?", (state["cid"],)).fetchone()["balance"]
-                    return {"role": "assistant", "content": f"Your balance is **${bal:,.2f}**.\n\n{again()}"}
-
-                if "transaction" in low or "recent" in low:
-                    with db() as c:
-                        tx = c.execute(
-                            """SELECT date, description, amount
-                            FROM transactions
-                            WHERE customer_id=? ORDER BY date DESC LIMIT 5""",
-                            (state["cid"],)).fetchall()
-                    if not tx:
-                        return {"role": "assistant", "content": "No recent transactions.\n\n"+again()}
-                    lines = ["Here are the last 5 transactions:"]
-                    lines += [f"- {t['date']}: {t['description']} (${t['amount']:.2f})" for t in tx]
-                    return {"role": "assistant", "content": "\n".join(lines)+"\n\n"+again()}
-
-            # savings products (anyone can ask)
-            if "saving" in low:
-                return {"role": "assistant",
-                        "content": ("We offer Basic Savings, **High-Yield Savings** (4.5 % APY) "
-                                    "and Money-Market Accounts. Reply **yes** for the link.\n\n"+again())}
+            # keyword-dispatched intents (balance/transactions need verification)
+            for kw, (fn, needs_exist) in _INTENTS.items():
+                if kw in low and (step == "ok_exist" or not needs_exist):
+                    return fn(state)
 
             if low == "yes":
                 return {"role": "assistant",
-                        "content": "Apply here → https://www.chase.com/personal/savings\n\n"+again()}
+                        "content": "Apply here → https://www.chase.com/personal/savings\n\n"+_AGAIN}
 
             # PDF question
-            if pdf_text:
-                answer = ask_llm(msg, pdf_text)
-                return {"role": "assistant", "content": answer+"\n\n"+again()}
+            if state.get("pdf_text"):
+                return _stream_reply(msg, state["pdf_text"])
 
             # fallback
-            return {"role": "assistant", "content": again()}
+            return {"role": "assistant", "content": _AGAIN}
 
         # ────────── exit confirmation ──────────
         if step == "confirm_exit":
             if low.startswith("y"):
-                state.clear(); state["step"] = "start"; pdf_text = None
+                state.clear(); state["step"] = "start"
                 return {"role": "assistant", "content": "Session closed. Have a great day!"}
             state["step"] = "ok_exist" if "cid" in state else "ok_new"
-            return {"role": "assistant", "content": "No problem — continuing. "+again()}
+            return {"role": "assistant", "content": "No problem — continuing. "+_AGAIN}
 
         # unknown state fallback
-        state.clear(); state["step"] = "start"; pdf_text = None
+        state.clear(); state["step"] = "start"
         return {"role": "assistant", "content": "Something went wrong — let's start again."}
 
     except Exception as e:
         print("❗", e)
-        state.clear(); state["step"] = "start"; pdf_text = None
+        state.clear(); state["step"] = "start"
         return {"role": "assistant", "content": "Internal error — please start again."}
 
 # ────────────────────────── upload handler ──────────────────────────
-def upload(path):
-    global pdf_text
+def upload(path, session):
     if not path:
-        pdf_text = None
+        session.pop("pdf_text", None)
         return ""
-    pdf_text = extract(path)
+    session["pdf_text"] = extract(path)
     return (f"✅ {os.path.basename(path)} uploaded successfully! "
             "Ask me anything about it.")
 
+def analyze_pdf(session):
+    """Run the canned FAQ against the uploaded PDF through the Batch API."""
+    if not session.get("pdf_text"):
+        return "Upload a PDF first."
+    answers = ask_llm_batch(BATCH_FAQ, session["pdf_text"])
+    return "\n\n".join(f"**{q}**\n{a}" for q, a in zip(BATCH_FAQ, answers))
+
 # ────────────────────────── UI build ──────────────────────────
 with gr.Blocks(theme=gr.themes.Soft()) as demo:
     gr.Markdown("# JP Morgan Chase • Financial Assistant")
 
+    session = gr.State(lambda: {"step": "start"})   # fresh dict per browser session
+
     chat_ui = gr.ChatInterface(
         fn=chat,
+        additional_inputs=[session],
         chatbot=gr.Chatbot(type="messages"),
         textbox=gr.Textbox(
             placeholder="Ask about balance, transactions, savings… or type upload"),
@@ -204,7 +532,11 @@ with gr.Blocks(theme=gr.themes.Soft()) as demo:
 
     uploader = gr.File(label="Upload Financial Document (PDF)",
                     file_types=[".pdf"], type="filepath")
-    uploader.change(upload, inputs=uploader, outputs=status)
+    uploader.change(upload, inputs=[uploader, session], outputs=status)
+
+    analyze_btn = gr.Button("Analyze PDF (batch)")
+    analyze_out = gr.Markdown()
+    analyze_btn.click(analyze_pdf, inputs=session, outputs=analyze_out)
 
 if __name__ == "__main__":
     demo.launch(share=True)
@@ -1,3 +1,13 @@
+import os
+import sys
+
+# Skip the rebuild when the deck is already newer than this script — the
+# slide content below is the only input, so an up-to-date artifact is final.
+file_path = "/mnt/data/JP_Morgan_FinAI_Agent.pptx"
+if os.path.exists(file_path) and os.path.getmtime(file_path) >= os.path.getmtime(__file__):
+    print(file_path)
+    sys.exit(0)
+
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
@@ -108,7 +118,6 @@ add_bullet_slide("Next Steps & Q&A", [
 ], "End with thank‑you and contact e‑mails")
 
 # Save presentation
-file_path = "/mnt/data/JP_Morgan_FinAI_Agent.pptx"
 prs.save(file_path)
 
 file_path